@@ -1,10 +1,18 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-import time
+import copy
+import functools
 import json as _json
 import os
+import threading
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el json estándar
+    orjson = None
 from pathlib import Path
 from streamlit import errors as _st_errors
 
@@ -16,8 +24,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS personalizado para mejor diseño
-st.markdown("""
+# CSS personalizado para mejor diseño (constante de módulo, sin formateo por rerun)
+_CSS_BLOB = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -41,6 +49,17 @@ st.markdown("""
         box-shadow: 0 2px 4px rgba(0,0,0,0.1);
         margin: 1rem 0rem;
     }
+    .stat-grid {
+        display: grid;
+        grid-template-columns: repeat(3, 1fr);
+        gap: 1rem;
+    }
+    /* en pantallas estrechas las tarjetas se apilan, como hacía st.columns */
+    @media (max-width: 640px) {
+        .stat-grid {
+            grid-template-columns: 1fr;
+        }
+    }
     .stat-card {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
         color: white;
@@ -63,12 +82,24 @@ st.markdown("""
         text-align: center;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+# Se emite en cada rerun: Streamlit borra los elementos que un rerun no vuelve a
+# pintar, así que inyectarlo una sola vez por sesión perdería los estilos.
+st.markdown(_CSS_BLOB, unsafe_allow_html=True)
 
-# Archivo de base de datos SQLite
+# Archivo de datos JSON (se sincroniza vía GitHub)
 DATA_DIR = Path(__file__).parent
+DATA_FILE = DATA_DIR / "data.json"
+# Versión de las reglas de estadísticas guardada en data.json (`_stats_version`)
+STATS_VERSION = 2
+
 
+def _empty_store():
+    """Store vacío con la marca de versión actual (dict nuevo en cada llamada)."""
+    return {"equipos": [], "partidos": [], "_stats_version": STATS_VERSION}
 
+
+@functools.lru_cache(maxsize=32)
 def safe_get_secret(key, default=None):
     """Intentar leer primero desde variables de entorno, luego desde st.secrets si está disponible.
     Evita que la ausencia de un secrets.toml lance una excepción.
@@ -110,22 +141,294 @@ def get_conn():
     # versión preferimos JSON en disco para sincronizar vía GitHub (actualizaciones
     # por push). Conservamos la función por compatibilidad, pero no abrimos
     # conexiones DB.
+    # Tampoco usamos SQLite: un .db binario no se puede revisar ni fusionar en Git.
+    # El coste de reescribir el JSON completo se acota con una sola escritura
+    # atómica por acción y estadísticas actualizadas de forma incremental.
+    # Lo que sí se comparte entre sesiones es el cerrojo de escritura (`_write_lock`).
     return None
 
 
+@st.cache_resource
+def _write_lock():
+    """Cerrojo de escritura único por proceso, compartido por todas las sesiones.
+
+    Hace el papel de la conexión compartida: las transacciones sobre `data.json`
+    de sesiones distintas se serializan en lugar de pisarse. Es reentrante para
+    que `_exclusive` y `_store_txn` puedan anidarse en el mismo hilo.
+    """
+    return threading.RLock()
+
+
+def _exclusive(fn):
+    """Ejecuta `fn` con el cerrojo de escritura tomado desde antes de leer el store,
+    de modo que lectura, validación (duplicados, nombres) y escritura forman una
+    sola sección crítica y otra sesión no puede colarse entre medias.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _write_lock():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
 def init_db():
     # Inicializar archivo JSON de datos si no existe
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    data_file = DATA_DIR / "data.json"
-    if not data_file.exists():
-        base = {"equipos": [], "partidos": []}
+    if not DATA_FILE.exists():
         try:
-            with open(data_file, "w", encoding="utf-8") as f:
-                _json.dump(base, f, ensure_ascii=False, indent=2)
+            _atomic_write(_empty_store())
         except Exception as e:
             st.warning(f"No se pudo crear data.json: {e}")
 
 
+@st.cache_resource
+def _store_cache():
+    """Contenedor por proceso del store parseado ({'store', 'mtime'}), compartido por
+    todas las sesiones en lugar de que cada una lea y parsee su propia copia.
+    """
+    return {'store': None, 'mtime': None}
+
+
+def _migrate_stats(store):
+    """Recalcula las estadísticas solo si el fichero viene de una versión anterior
+    de las reglas (marca `_stats_version`); si ya está al día no escribe nada.
+
+    Devuelve el store vigente: el migrado si hubo que escribir, si no el recibido.
+    """
+    if store.get('_stats_version', 0) >= STATS_VERSION:
+        return store
+    # como los helpers `@_exclusive`: comprobar y releer con el cerrojo tomado,
+    # para no pisar una escritura de otra sesión hecha tras la lectura del llamador
+    with _write_lock():
+        store = _load_store()
+        if store.get('_stats_version', 0) >= STATS_VERSION:
+            return store
+        try:
+            with _store_txn(store) as nuevo:
+                _recompute_stats(nuevo)
+                # persistir correcciones
+                nuevo['_stats_version'] = STATS_VERSION
+            return nuevo
+        except Exception as e:
+            # si algo falla, no rompemos la carga; se usa lo que tengamos
+            st.warning(f"No se pudieron migrar las estadísticas de data.json: {e}")
+            return store
+
+
+@st.cache_resource
+def _ensure_schema():
+    """Ejecuta `init_db()` y la migración de estadísticas una sola vez por proceso,
+    no en cada carga de datos.
+    """
+    init_db()
+    try:
+        _migrate_stats(_load_store())
+    except Exception:
+        # load_data() avisará si data.json no se puede leer
+        pass
+    return True
+
+
+def _load_store():
+    """Devuelve el contenido de `data.json` ya parseado.
+
+    El dict se guarda en `_store_cache()` junto con el mtime del fichero, así que
+    solo se vuelve a leer de disco cuando el fichero cambió (p. ej. tras un push).
+    Lanza excepción si el fichero no existe o está corrupto.
+    """
+    mtime = os.path.getmtime(DATA_FILE)
+    cache = _store_cache()
+    if cache['store'] is not None and cache['mtime'] == mtime:
+        return cache['store']
+    with open(DATA_FILE, "rb") as f:
+        raw = f.read()
+    store = _loads_json(raw)
+    cache['store'], cache['mtime'] = store, mtime
+    return store
+
+
+def _loads_json(raw):
+    """Parsea JSON (str o bytes) con orjson si está instalado."""
+    return orjson.loads(raw) if orjson else _json.loads(raw)
+
+
+def _dumps_rounds(rondas):
+    """Serializa el detalle de rondas de un partido para `rounds_json` (str compacto)."""
+    if orjson:
+        return orjson.dumps(rondas).decode("utf-8")
+    return _json.dumps(rondas, ensure_ascii=False, separators=(",", ":"))
+
+
+def _dumps_store(store):
+    """Serializa el store a bytes JSON indentado (orjson si está instalado).
+
+    Se mantiene la indentación de 2 espacios porque `data.json` se revisa y se
+    fusiona en GitHub; ambas ramas producen exactamente los mismos bytes que el
+    `json.dump(..., ensure_ascii=False, indent=2)` original.
+    """
+    if orjson:
+        return orjson.dumps(store, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return _json.dumps(store, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def pretty_dump():
+    """Contenido actual de `data.json` indentado, para exportarlo y revisarlo a mano."""
+    with open(DATA_FILE, "rb") as f:
+        raw = f.read()
+    if orjson:
+        return orjson.dumps(orjson.loads(raw), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return _json.dumps(_json.loads(raw), ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _atomic_write(store):
+    """Escribe el store en un fichero temporal y lo renombra sobre `data.json`.
+
+    `os.replace` es atómico, así que quien lea el fichero nunca ve un JSON a medio
+    escribir. Las sesiones, en cambio, leen el store en memoria de `_store_cache()`:
+    lo que les garantiza ver la versión anterior hasta el final es que `_store_txn`
+    trabaja sobre una copia y solo la sustituye tras esta escritura.
+
+    No se fuerza `fsync` en cada escritura; ante un corte de luz se pierde como
+    mucho la última acción, y `data.json` ya tiene copia en GitHub.
+    """
+    tmp = DATA_FILE.with_name(DATA_FILE.name + ".tmp")
+    try:
+        with open(tmp, "wb", buffering=1 << 20) as f:
+            f.write(_dumps_store(store))
+        os.replace(tmp, DATA_FILE)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _flush_store(store):
+    """Escribe `store` en `data.json` (una sola escritura por acción) y refresca la caché."""
+    cache = _store_cache()
+    _atomic_write(store)
+    cache['store'], cache['mtime'] = store, os.path.getmtime(DATA_FILE)
+
+
+def _pair_key(equipo1_id, equipo2_id):
+    """Clave de un enfrentamiento independiente del orden de los equipos."""
+    return (equipo1_id, equipo2_id) if equipo1_id <= equipo2_id else (equipo2_id, equipo1_id)
+
+
+def _store_index(store, nombre, build):
+    """Índice derivado del store (`build(store)`), guardado en la sesión.
+
+    Se construye una vez por versión del store: si `_load_store()` vuelve a leer el
+    fichero (objeto distinto) o el store compartido se escribió desde otra sesión
+    (mtime distinto) el índice se reconstruye en el siguiente uso.
+    """
+    key = f'_idx_{nombre}'
+    mtime = _store_cache()['mtime']
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] is not store or cached[1] != mtime:
+        cached = (store, mtime, build(store))
+        st.session_state[key] = cached
+    return cached[2]
+
+
+def _pair_index(store):
+    """Índice {_pair_key: partido_id} de los enfrentamientos ya jugados, para
+    comprobar si un par ya jugó sin recorrer todos los partidos.
+    """
+    return _store_index(store, 'pares', lambda s: {
+        _pair_key(p.get('equipo1_id'), p.get('equipo2_id')): p.get('id')
+        for p in s.get('partidos', [])})
+
+
+def _name_index(store):
+    """Índice {nombre: equipo} de los equipos del store (el primero gana si hay repetidos)."""
+    return _store_index(store, 'nombres', lambda s: {
+        e.get('nombre'): e for e in reversed(s.get('equipos', []))})
+
+
+def _id_index(store):
+    """Índice {id: equipo} de los equipos del store."""
+    return _store_index(store, 'ids', lambda s: {e.get('id'): e for e in s.get('equipos', [])})
+
+
+def _apply_partido_stats(equipos_map, p, sign=1):
+    """Suma (`sign=1`) o resta (`sign=-1`) la contribución de un partido a las
+    estadísticas de sus dos equipos. `equipos_map` es {id: equipo}.
+    """
+    g = p.get
+    em_get = equipos_map.get
+    e1 = em_get(g('equipo1_id'))
+    e2 = em_get(g('equipo2_id'))
+    if not e1 or not e2:
+        return
+    e1['partidos_jugados'] = e1.get('partidos_jugados', 0) + sign
+    e2['partidos_jugados'] = e2.get('partidos_jugados', 0) + sign
+    # puntos: SOLO los bonos por rondas al ganador del partido
+    ganador_id = g('ganador_id')
+    if ganador_id == e1.get('id'):
+        ganador, perdedor, bonus = e1, e2, g('round_bonus_e1')
+    elif ganador_id == e2.get('id'):
+        ganador, perdedor, bonus = e2, e1, g('round_bonus_e2')
+    else:
+        return
+    ganador['puntos_total'] = ganador.get('puntos_total', 0) + sign * (bonus or 0)
+    ganador['partidos_ganados'] = ganador.get('partidos_ganados', 0) + sign
+    perdedor['partidos_perdidos'] = perdedor.get('partidos_perdidos', 0) + sign
+
+
+def _recompute_stats(store):
+    """Recalcula desde cero las estadísticas de todos los equipos a partir de los partidos.
+
+    Agrega con pandas (value_counts/groupby) en lugar de recorrer los partidos en Python.
+    """
+    equipos = store.get('equipos', [])
+    df = pd.DataFrame(store.get('partidos', []),
+                      columns=['equipo1_id', 'equipo2_id', 'ganador_id', 'round_bonus_e1', 'round_bonus_e2'])
+    # ignorar partidos cuyos equipos ya no existen
+    ids = [e['id'] for e in equipos]
+    df = df[df['equipo1_id'].isin(ids) & df['equipo2_id'].isin(ids)]
+    gana_e1 = df[df['ganador_id'] == df['equipo1_id']]
+    gana_e2 = df[df['ganador_id'] == df['equipo2_id']]
+
+    jugados = pd.concat([df['equipo1_id'], df['equipo2_id']]).value_counts()
+    ganados = pd.concat([gana_e1['equipo1_id'], gana_e2['equipo2_id']]).value_counts()
+    perdidos = pd.concat([gana_e1['equipo2_id'], gana_e2['equipo1_id']]).value_counts()
+    # puntos: SOLO los bonos por rondas al ganador del partido
+    puntos = (gana_e1['round_bonus_e1'].fillna(0).groupby(gana_e1['equipo1_id']).sum()
+              .add(gana_e2['round_bonus_e2'].fillna(0).groupby(gana_e2['equipo2_id']).sum(), fill_value=0))
+
+    for e in equipos:
+        eid = e['id']
+        e['puntos_total'] = int(puntos.get(eid, 0))
+        e['partidos_jugados'] = int(jugados.get(eid, 0))
+        e['partidos_ganados'] = int(ganados.get(eid, 0))
+        e['partidos_perdidos'] = int(perdidos.get(eid, 0))
+
+
+@contextmanager
+def _store_txn(store=None):
+    """Agrupa las mutaciones de una acción: lee el store una vez (o usa el que
+    recibe, ya validado por el llamador), cede una copia para modificarla y la
+    escribe una sola vez al salir, sustituyendo entonces el store compartido.
+    Los llamadores deben modificar solo la copia cedida. Si el bloque lanza no
+    se escribe nada y el store compartido queda intacto.
+
+    Tras una escritura correcta incrementa `data_version` y vacía la caché de
+    `load_data()` y las vistas derivadas, de modo que solo las mutaciones
+    invalidan los datos de la UI.
+    """
+    if store is None:
+        store = _load_store()
+    with _write_lock():
+        # copia de trabajo: el store compartido no se toca hasta el cambio final,
+        # así las demás sesiones nunca leen un estado a medio modificar
+        nuevo = copy.deepcopy(store)
+        yield nuevo
+        _flush_store(nuevo)
+    st.session_state['data_version'] = st.session_state.get('data_version', 0) + 1
+    for cached_fn in (_load_data_cached, _team_names, _played_against, build_standings_df,
+                      build_resultados_df, build_gestion_df):
+        cached_fn.clear()
+
+
 # No se usa almacenamiento de contraseña; uso contraseña fija en código para uso personal
 
 
@@ -133,94 +436,97 @@ def load_data():
     """Carga `equipos` y `partidos` desde `data.json` y devuelve listas en el mismo
     formato que antes para minimizar cambios en la UI.
 
-    Aplicamos una recalculación segura de estadísticas en los datos en disco
-    para que los cambios de reglas (puntos solo al ganador por rondas)
-    se apliquen también a partidos ya existentes.
+    Si `data.json` no tiene la marca `_stats_version` actual se recalculan (una
+    sola vez) las estadísticas para que los cambios de reglas (puntos solo al
+    ganador por rondas) se apliquen también a partidos ya existentes.
+
+    El resultado se memoriza con `st.cache_data` usando como clave el mtime del
+    fichero y el contador `data_version` (que solo avanza al escribir), así que
+    los reruns provocados por widgets no vuelven a construir las listas.
     """
-    init_db()
-    data_file = DATA_DIR / "data.json"
-    equipos = []
-    partidos_out = []
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception as e:
         st.warning(f"No se pudo leer data.json: {e}")
-        store = {"equipos": [], "partidos": []}
+        return [], []
 
-    # Recalcular y corregir estadísticas en el store para aplicar la nueva regla
+    # normalmente ya migrado en `_ensure_schema`; esto cubre un data.json antiguo
+    # que llegue con el proceso en marcha (p. ej. tras un push)
     try:
-        # inicializar
-        for e in store.get('equipos', []):
-            e['puntos_total'] = 0
-            e['partidos_jugados'] = 0
-            e['partidos_ganados'] = 0
-            e['partidos_perdidos'] = 0
-
-        equipos_map = {e['id']: e for e in store.get('equipos', [])}
-        for p in store.get('partidos', []):
-            e1 = equipos_map.get(p.get('equipo1_id'))
-            e2 = equipos_map.get(p.get('equipo2_id'))
-            if not e1 or not e2:
-                continue
-            # contabilizar jugados
-            e1['partidos_jugados'] = e1.get('partidos_jugados', 0) + 1
-            e2['partidos_jugados'] = e2.get('partidos_jugados', 0) + 1
-            # puntos: SOLO los bonos por rondas al ganador del partido
-            if p.get('ganador_id') == e1.get('id'):
-                e1['puntos_total'] = e1.get('puntos_total', 0) + (p.get('round_bonus_e1') or 0)
-                equipos_map[p.get('ganador_id')]['partidos_ganados'] = equipos_map[p.get('ganador_id')].get('partidos_ganados', 0) + 1
-                loser = p.get('equipo2_id') if p.get('ganador_id') == p.get('equipo1_id') else p.get('equipo1_id')
-                equipos_map[loser]['partidos_perdidos'] = equipos_map[loser].get('partidos_perdidos', 0) + 1
-            elif p.get('ganador_id') == e2.get('id'):
-                e2['puntos_total'] = e2.get('puntos_total', 0) + (p.get('round_bonus_e2') or 0)
-                equipos_map[p.get('ganador_id')]['partidos_ganados'] = equipos_map[p.get('ganador_id')].get('partidos_ganados', 0) + 1
-                loser = p.get('equipo2_id') if p.get('ganador_id') == p.get('equipo1_id') else p.get('equipo1_id')
-                equipos_map[loser]['partidos_perdidos'] = equipos_map[loser].get('partidos_perdidos', 0) + 1
-
-        # persistir correcciones
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
-    except Exception:
-        # si algo falla, no rompemos la carga; devolvemos lo que tengamos
-        pass
+        store = _migrate_stats(store)
+    except Exception as e:
+        st.warning(f"No se pudo leer data.json: {e}")
+        return [], []
+
+    # clave de los datos que la UI va a guardar en la sesión; la usan las vistas
+    # cacheadas. El mtime es el que `_load_store()` acaba de comprobar: equipos y
+    # partidos salen de una sola lectura y un solo stat del fichero.
+    data_key = (_store_cache()['mtime'], st.session_state.get('data_version', 0))
+    st.session_state['_data_key'] = data_key
+    return _load_data_cached(*data_key, store)
 
-    # Equipos: ya contienen los campos necesarios
-    equipos = store.get("equipos", [])
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _load_data_cached(mtime, version, _store):
+    """Convierte el store al formato de la UI. `mtime` y `version` son solo la
+    clave de caché; `_store` (con guion bajo) no se hashea.
+
+    El detalle de rondas (`rounds_json`) se decodifica aquí una sola vez por carga
+    y se expone ya parseado en `rounds`, junto con lo que se deriva de él: el
+    ganador de cada ronda (`winners`, valores de `round_winner`) y los sets.
+    """
+    # Equipos: ya contienen los campos necesarios. Es la única copia que se hace:
+    # en un fallo de caché st.cache_data devuelve este mismo objeto (no una copia
+    # deserializada), y sin ella la UI de la sesión podría modificar los dicts del
+    # store compartido de `_store_cache()`, que se trata como inmutable.
+    equipos = [e.copy() for e in _store.get("equipos", [])]
 
     # Partidos: convertir ids a nombres en la estructura esperada por la UI
-    equipos_by_id = {e['id']: e['nombre'] for e in equipos}
-    for p in store.get("partidos", []):
-        partido = {
-            'id': p.get('id'),
-            'ronda': p.get('ronda'),
-            'equipo1': equipos_by_id.get(p.get('equipo1_id')),
-            'equipo2': equipos_by_id.get(p.get('equipo2_id')),
-            'puntos_j1': p.get('puntos_e1'),
-            'puntos_j2': p.get('puntos_e2'),
-            'rounds_json': p.get('rounds_json'),
-            'match_pts_e1': p.get('match_pts_e1'),
-            'match_pts_e2': p.get('match_pts_e2'),
-            'ganador': equipos_by_id.get(p.get('ganador_id')) if p.get('ganador_id') is not None else 'Empate',
-            'fecha': p.get('fecha')
-        }
-        partidos_out.append(partido)
+    partidos_out = []
+    # alias locales: evitan resolver `.get` en cada iteración
+    nombre_de = {e['id']: e['nombre'] for e in equipos}.get
+    append = partidos_out.append
+    for p in _store.get("partidos", []):
+        g = p.get
+        ganador_id = g('ganador_id')
+        try:
+            rounds = _loads_json(g('rounds_json') or '[]')
+        except Exception:
+            rounds = []
+        winners = [round_winner(int(r.get('puntos_e1', 0)), int(r.get('puntos_e2', 0))) for r in rounds]
+        append({
+            'id': g('id'),
+            'ronda': g('ronda'),
+            'equipo1': nombre_de(g('equipo1_id')),
+            'equipo2': nombre_de(g('equipo2_id')),
+            'puntos_j1': g('puntos_e1'),
+            'puntos_j2': g('puntos_e2'),
+            'rounds_json': g('rounds_json'),
+            'rounds': rounds,
+            'winners': winners,
+            'sets_e1': winners.count(1),
+            'sets_e2': winners.count(-1),
+            'match_pts_e1': g('match_pts_e1'),
+            'match_pts_e2': g('match_pts_e2'),
+            'ganador': nombre_de(ganador_id) if ganador_id is not None else 'Empate',
+            'fecha': g('fecha')
+        })
 
     return equipos, partidos_out
 
 
+@_exclusive
 def add_team_db(nombre, jugador1, jugador2):
     # Persistencia basada en JSON: añadir equipo a data.json
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    data_file = DATA_DIR / "data.json"
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception:
-        store = {"equipos": [], "partidos": []}
+        store = _empty_store()
 
     # comprobar duplicado por nombre
-    if any(e.get('nombre') == nombre for e in store.get('equipos', [])):
+    por_nombre = _name_index(store)
+    if nombre in por_nombre:
         return None
 
     next_id = 1
@@ -238,29 +544,29 @@ def add_team_db(nombre, jugador1, jugador2):
         'partidos_ganados': 0,
         'partidos_perdidos': 0
     }
-    store.setdefault('equipos', []).append(equipo)
     try:
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
+        with _store_txn(store) as nuevo:
+            nuevo.setdefault('equipos', []).append(equipo)
         return next_id
     except Exception as e:
         st.warning(f"No se pudo guardar el equipo: {e}")
         return None
 
 
+@_exclusive
 def rename_team_db(equipo_id, nuevo_nombre):
     """Renombra un equipo por su id, evitando duplicados de nombre."""
-    data_file = DATA_DIR / "data.json"
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception:
         st.warning("No se pudo leer data.json")
         return False
 
     equipos = store.get('equipos', [])
     # verificar si existe otro equipo con mismo nombre
-    if any(e.get('nombre') == nuevo_nombre and e.get('id') != equipo_id for e in equipos):
+    por_nombre = _name_index(store)
+    otro = por_nombre.get(nuevo_nombre)
+    if otro is not None and otro.get('id') != equipo_id:
         st.error("Ya existe un equipo con ese nombre.")
         return False
 
@@ -269,104 +575,117 @@ def rename_team_db(equipo_id, nuevo_nombre):
         st.error("Equipo no encontrado")
         return False
 
-    equipo['nombre'] = nuevo_nombre
+    if equipo.get('nombre') == nuevo_nombre:
+        # mismo nombre: no hay nada que escribir
+        return True
+
     try:
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
+        with _store_txn(store) as nuevo:
+            next(e for e in nuevo['equipos'] if e.get('id') == equipo_id)['nombre'] = nuevo_nombre
         return True
     except Exception as e:
         st.warning(f"No se pudo renombrar el equipo: {e}")
         return False
 
 
+def round_winner(p1, p2):
+    """Ganador de una ronda: 1 si la gana el equipo 1, -1 si el equipo 2, 0 si no hay ganador.
+
+    Gana quien marca exactamente 100; si ninguno o ambos lo hacen, quien tenga más puntos.
+    """
+    # exactamente uno marcó 100: decide el XOR; si no, comparar puntos
+    if (p1 == 100) ^ (p2 == 100):
+        return 1 if p1 == 100 else -1
+    return (p1 > p2) - (p2 > p1)
+
+
+def _match_winner(sets_e1, sets_e2, total_e1, total_e2, equipo1_id, equipo2_id):
+    """Ganador de un partido: quien llegó a 2 sets; si nadie (caso excepcional),
+    quien sumó más puntos; con empate exacto en totales, el equipo1 (determinista).
+    """
+    if sets_e1 >= 2:
+        return equipo1_id
+    if sets_e2 >= 2:
+        return equipo2_id
+    return equipo2_id if total_e2 > total_e1 else equipo1_id
+
+
+def _round_masks(p1, p2):
+    """Máscaras (gana1, gana2) de las rondas ganadas por cada equipo, para arrays de
+    puntos `p1`/`p2`: misma regla que `round_winner` aplicada a todas las rondas a la vez.
+    """
+    cien1, cien2 = p1 == 100, p2 == 100
+    por_cien = cien1 ^ cien2
+    return np.where(por_cien, cien1, p1 > p2), np.where(por_cien, cien2, p2 > p1)
+
+
+def sets_won(p1, p2):
+    """Sets (rondas) ganados por cada equipo: (sets_e1, sets_e2)."""
+    gana1, gana2 = _round_masks(np.asarray(p1), np.asarray(p2))
+    return int(gana1.sum()), int(gana2.sum())
+
+
+def _score_rounds(rounds_list, equipo1_id, equipo2_id):
+    """Puntúa las rondas de un partido de forma vectorizada.
+
+    Una ronda la gana quien marca exactamente 100 (si ninguno o ambos lo hacen,
+    quien tenga más puntos; igualdad = sin ganador). El ganador de la ronda suma un
+    bono de 2 si la diferencia es >= 35, si no 1.
+
+    Devuelve (total_e1, total_e2, sets_e1, sets_e2, bonus_e1, bonus_e2, rondas), con
+    `rondas` en el formato serializable [{'puntos_e1', 'puntos_e2', 'winner_id'}, ...].
+    """
+    pts = np.array([[int(rd.get('puntos_e1', 0)), int(rd.get('puntos_e2', 0))] for rd in rounds_list],
+                   dtype=np.int64).reshape(-1, 2)
+    p1, p2 = pts[:, 0], pts[:, 1]
+    gana1, gana2 = _round_masks(p1, p2)
+    bonus = np.where(np.abs(p1 - p2) >= 35, 2, 1)
+    winners = np.where(gana1, 1, np.where(gana2, 2, 0)).tolist()
+    rondas = [{'puntos_e1': x, 'puntos_e2': y, 'winner_id': (None, equipo1_id, equipo2_id)[w]}
+              for x, y, w in zip(p1.tolist(), p2.tolist(), winners)]
+    return (int(p1.sum()), int(p2.sum()), int(gana1.sum()), int(gana2.sum()),
+            int(bonus[gana1].sum()), int(bonus[gana2].sum()), rondas)
+
+
+@_exclusive
 def add_partido_db(ronda, equipo1_name, equipo2_name, rounds_list, fecha):
     """Guarda un partido compuesto por varias rondas.
     `rounds_list` es una lista de dicts: [{'puntos_e1': int, 'puntos_e2': int}, ...]
     """
-    import json as _json
     # Almacenar partido en data.json
-    data_file = DATA_DIR / "data.json"
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception:
         st.warning("No se encontró data.json o está corrupto")
         return None
 
     # buscar ids por nombre
-    equipos = store.get('equipos', [])
-    e1 = next((e for e in equipos if e.get('nombre') == equipo1_name), None)
-    e2 = next((e for e in equipos if e.get('nombre') == equipo2_name), None)
+    por_nombre = _name_index(store)
+    e1 = por_nombre.get(equipo1_name)
+    e2 = por_nombre.get(equipo2_name)
     if not e1 or not e2:
         st.warning("Uno de los equipos no existe en la base de datos")
         return None
     equipo1_id = e1['id']
     equipo2_id = e2['id']
 
-    # evitar duplicados (independientemente del orden)
-    for p in store.get('partidos', []):
-        if {p.get('equipo1_id'), p.get('equipo2_id')} == {equipo1_id, equipo2_id}:
-            st.warning("❌ Ya existe un partido entre estos equipos. No se permiten duplicados.")
-            return None
-
-    # calcular totales y sets
-    total_e1 = 0
-    total_e2 = 0
-    sets_e1 = 0
-    sets_e2 = 0
-    rounds_serializable = []
-    # bonos por ronda: si la diferencia es >=35 -> +2 puntos, si es menor -> +1 punto (solo al ganador de la ronda)
-    round_bonus_e1 = 0
-    round_bonus_e2 = 0
-    for rd in rounds_list:
-        pe1 = int(rd.get('puntos_e1', 0))
-        pe2 = int(rd.get('puntos_e2', 0))
-        total_e1 += pe1
-        total_e2 += pe2
-        if pe1 == 100 or pe2 == 100:
-            if pe1 == 100 and pe2 != 100:
-                sets_e1 += 1
-                winner = equipo1_id
-            elif pe2 == 100 and pe1 != 100:
-                sets_e2 += 1
-                winner = equipo2_id
-            else:
-                winner = None
-        else:
-            if pe1 > pe2:
-                sets_e1 += 1
-                winner = equipo1_id
-            elif pe2 > pe1:
-                sets_e2 += 1
-                winner = equipo2_id
-            else:
-                winner = None
-        # calcular bono por la ronda
-        if winner == equipo1_id:
-            diff = abs(pe1 - pe2)
-            round_bonus_e1 += 2 if diff >= 35 else 1
-        elif winner == equipo2_id:
-            diff = abs(pe1 - pe2)
-            round_bonus_e2 += 2 if diff >= 35 else 1
-
-        rounds_serializable.append({'puntos_e1': pe1, 'puntos_e2': pe2, 'winner_id': winner})
-
-    # Determinar ganador: preferir al que ganó 2 sets.
-    # Si nadie alcanzó 2 sets (caso excepcional), desempatar por puntos totales.
-    if sets_e1 >= 2:
-        ganador_id = equipo1_id
-    elif sets_e2 >= 2:
-        ganador_id = equipo2_id
-    else:
-        if total_e1 > total_e2:
-            ganador_id = equipo1_id
-        elif total_e2 > total_e1:
-            ganador_id = equipo2_id
-        else:
-            # Empate exacto en totales (muy raro): asignar ganador por determinismo al equipo1
-            ganador_id = equipo1_id
+    # evitar duplicados (independientemente del orden): el índice de pares
+    # normalizados hace de restricción única y, como la función corre con el
+    # cerrojo de escritura tomado, ninguna otra sesión puede insertar el mismo
+    # par entre esta comprobación y la escritura
+    pares = _pair_index(store)
+    if _pair_key(equipo1_id, equipo2_id) in pares:
+        st.warning("❌ Ya existe un partido entre estos equipos. No se permiten duplicados.")
+        return None
 
-    rounds_json = _json.dumps(rounds_serializable, ensure_ascii=False)
+    # calcular totales, sets y bonos por ronda
+    (total_e1, total_e2, sets_e1, sets_e2,
+     round_bonus_e1, round_bonus_e2, rounds_serializable) = _score_rounds(rounds_list, equipo1_id, equipo2_id)
+
+    # Determinar ganador: preferir al que ganó 2 sets, si no desempatar por totales
+    ganador_id = _match_winner(sets_e1, sets_e2, total_e1, total_e2, equipo1_id, equipo2_id)
+
+    rounds_json = _dumps_rounds(rounds_serializable)
 
     # En esta regla los equipos NO reciben puntos de partido (3/0)
     # Los puntos se otorgan solo como bonos por rondas y SOLO al ganador del partido.
@@ -392,65 +711,136 @@ def add_partido_db(ronda, equipo1_name, equipo2_name, rounds_list, fecha):
         'fecha': fecha
     }
 
-    store.setdefault('partidos', []).append(partido)
-
-    # recalcular estadísticas globales desde partidos
     try:
-        # inicializar
-        for e in store.get('equipos', []):
-            e['puntos_total'] = 0
-            e['partidos_jugados'] = 0
-            e['partidos_ganados'] = 0
-            e['partidos_perdidos'] = 0
-
-        equipos_map = {e['id']: e for e in store.get('equipos', [])}
-        for p in store.get('partidos', []):
-            e1 = equipos_map.get(p.get('equipo1_id'))
-            e2 = equipos_map.get(p.get('equipo2_id'))
-            if not e1 or not e2:
-                continue
-            # contabilizar jugados
-            e1['partidos_jugados'] = e1.get('partidos_jugados', 0) + 1
-            e2['partidos_jugados'] = e2.get('partidos_jugados', 0) + 1
-            # puntos: ahora solo se otorgan los bonos por rondas AL GANADOR del partido
-            if p.get('ganador_id') == e1.get('id'):
-                e1['puntos_total'] = e1.get('puntos_total', 0) + (p.get('round_bonus_e1') or 0)
-            if p.get('ganador_id') == e2.get('id'):
-                e2['puntos_total'] = e2.get('puntos_total', 0) + (p.get('round_bonus_e2') or 0)
-            if p.get('ganador_id') is not None:
-                equipos_map[p.get('ganador_id')]['partidos_ganados'] = equipos_map[p.get('ganador_id')].get('partidos_ganados', 0) + 1
-                loser = p.get('equipo2_id') if p.get('ganador_id') == p.get('equipo1_id') else p.get('equipo1_id')
-                equipos_map[loser]['partidos_perdidos'] = equipos_map[loser].get('partidos_perdidos', 0) + 1
-
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
+        with _store_txn(store) as nuevo:
+            nuevo.setdefault('partidos', []).append(partido)
+            # actualizar estadísticas solo de los dos equipos implicados
+            _apply_partido_stats(_id_index(nuevo), partido)
         return next_id
     except Exception as e:
         st.warning(f"Error guardando partido en JSON: {e}")
         return None
 
 
-# Inicializar session state (cargar persistencia si existe)
-if 'partidos' not in st.session_state or 'equipos' not in st.session_state:
+@st.cache_data(show_spinner=False)
+def build_gestion_df(data_key, _equipos):
+    """Tabla de "Gestión de Equipos" con sus columnas relevantes, cacheada por
+    `data_key`: los reruns del panel sin cambios en los datos no la reconstruyen.
+    """
+    return pd.DataFrame.from_records(_equipos, columns=['id', 'nombre', 'jugador1', 'jugador2', 'puntos_total', 'partidos_ganados', 'partidos_perdidos', 'partidos_jugados'])
+
+
+def get_equipos_by_id():
+    """Mapa {id: nombre} de los equipos de la sesión.
+
+    Se guarda en `st.session_state._equipos_by_id` junto con el `_data_key` de los
+    datos con que se construyó, como las vistas cacheadas: se reconstruye cada vez
+    que `load_data()` trae datos nuevos, también si los escribió otra sesión.
+    """
+    data_key = st.session_state.get('_data_key')
+    cached = st.session_state.get('_equipos_by_id')
+    if cached is None or cached[0] != data_key:
+        cached = (data_key, {e['id']: e['nombre'] for e in st.session_state.equipos})
+        st.session_state._equipos_by_id = cached
+    return cached[1]
+
+
+@st.cache_data(show_spinner=False)
+def _team_names(data_key, _equipos):
+    """Nombres de los equipos (en orden de alta) como tupla, cacheada por `data_key`."""
+    return tuple(e['nombre'] for e in _equipos)
+
+
+@st.cache_data(show_spinner=False, ttl=60)
+def _played_against(mtime, _store):
+    """Mapa {nombre: frozenset(rivales ya enfrentados)} construido desde el store en
+    una sola pasada por los partidos y cacheado por el mtime de `data.json`.
+    """
+    nombre_de = {e['id']: e['nombre'] for e in _store.get('equipos', [])}.get
+    rivales = defaultdict(set)
+    for p in _store.get('partidos', []):
+        e1, e2 = nombre_de(p.get('equipo1_id')), nombre_de(p.get('equipo2_id'))
+        rivales[e1].add(e2)
+        rivales[e2].add(e1)
+    return {nombre: frozenset(r) for nombre, r in rivales.items()}
+
+
+def opponents_played(team_name):
+    """Rivales que ya jugaron contra `team_name`, leídos del store compartido y no de
+    la sesión: reflejan también lo que haya escrito otra sesión.
+    """
+    try:
+        store = _load_store()
+    except Exception:
+        return frozenset()
+    return _played_against(_store_cache()['mtime'], store).get(team_name, frozenset())
+
+
+@st.cache_data(show_spinner=False)
+def build_standings_df(data_key, _equipos):
+    """Tabla de posiciones (ordenada por puntos y partidos ganados) de `_equipos`.
+
+    `data_key` es la clave (mtime, data_version) de la última carga y `_equipos`
+    no se hashea: cambiar de vista no reconstruye el DataFrame mientras no
+    cambien los datos.
+    """
+    stats = ['partidos_jugados', 'partidos_ganados', 'partidos_perdidos', 'puntos_total']
+    df = pd.DataFrame.from_records(_equipos, columns=['nombre', 'jugador1', 'jugador2'] + stats)
+    df[stats] = df[stats].fillna(0).astype(int)
+    # orden por puntos y luego partidos ganados (desc) con un único lexsort
+    order = np.lexsort((-df['partidos_ganados'].to_numpy(), -df['puntos_total'].to_numpy()))
+    df = df.iloc[order].reset_index(drop=True)
+    df.insert(0, 'posicion', np.arange(1, len(df) + 1))
+    # concatenación vectorizada en lugar de un apply por fila
+    df['jugadores'] = df['jugador1'].fillna('') + ' & ' + df['jugador2'].fillna('')
+    return df[['posicion', 'nombre', 'jugadores'] + stats]
+
+
+@st.cache_data(show_spinner=False)
+def build_resultados_df(data_key, _partidos):
+    """Resultados completos en una sola tabla: una fila por ronda de cada partido
+    (del más reciente al más antiguo). Cacheada por `data_key` como la tabla de
+    posiciones.
+    """
+    rows = []
+    append = rows.append
+    for p in sorted(_partidos, key=lambda x: x['id'], reverse=True):
+        e1, e2 = p.get('equipo1'), p.get('equipo2')
+        partido = f"#{p.get('id')} {e1} vs {e2} ({p.get('sets_e1', 0)}-{p.get('sets_e2', 0)})"
+        ganador_partido = p.get('ganador')
+        # ganador de cada ronda ya calculado al cargar: 1 → equipo1, -1 → equipo2
+        ganador_ronda = ('', e1, e2)
+        winners = p.get('winners') or [0]
+        rounds = p.get('rounds') or [{'puntos_e1': p.get('puntos_j1'), 'puntos_e2': p.get('puntos_j2')}]
+        for idx, (r, w) in enumerate(zip(rounds, winners), start=1):
+            append({
+                'Partido': partido,
+                'Ronda': idx if p.get('rounds') else None,
+                'Equipo1': e1,
+                'Pts1': r.get('puntos_e1'),
+                'Equipo2': e2,
+                'Pts2': r.get('puntos_e2'),
+                'Ganador': ganador_ronda[w],
+                'Ganador partido': ganador_partido,
+            })
+    df = pd.DataFrame(rows, columns=['Partido', 'Ronda', 'Equipo1', 'Pts1', 'Equipo2', 'Pts2',
+                                     'Ganador', 'Ganador partido'])
+    # entero con nulos: los partidos sin detalle de rondas no muestran "1.0"
+    df['Ronda'] = df['Ronda'].astype('Int64')
+    return df
+
+
+def _refresh_state():
+    """Recarga equipos y partidos en la sesión tras una escritura correcta.
+
+    `_store_txn` ya ha avanzado `data_version` y vaciado la caché de `load_data()`,
+    así que aquí solo se vuelven a enlazar las listas de la UI. Las estadísticas
+    de los equipos vienen ya mantenidas en `data.json` por `_apply_partido_stats`.
+    """
     equipos, partidos = load_data()
-    st.session_state.partidos = partidos or []
     st.session_state.equipos = equipos or []
-if 'ronda_actual' not in st.session_state:
-    st.session_state.ronda_actual = 1
-# Estado de sesión para autenticación de organizador
-if 'is_admin' not in st.session_state:
-    st.session_state.is_admin = False
+    st.session_state.partidos = partidos or []
 
-# Función para calcular estadísticas
-def calcular_estadisticas():
-    for equipo in st.session_state.equipos:
-        nombre = equipo.get('nombre')
-        equipo['partidos_jugados'] = len([p for p in st.session_state.partidos 
-                                         if nombre in [p.get('equipo1'), p.get('equipo2')]])
-        equipo['partidos_ganados'] = len([p for p in st.session_state.partidos 
-                                         if p.get('ganador') == nombre])
-        equipo['partidos_perdidos'] = len([p for p in st.session_state.partidos 
-                                         if (p.get('equipo1') == nombre or p.get('equipo2') == nombre) and p.get('ganador') not in (None, 'Empate', nombre)])
 
 # Función para agregar partido
 def agregar_partido(equipo1_name, equipo2_name, rounds_list):
@@ -458,20 +848,16 @@ def agregar_partido(equipo1_name, equipo2_name, rounds_list):
     fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
     new_id = add_partido_db(st.session_state.ronda_actual, equipo1_name, equipo2_name, rounds_list, fecha)
     if new_id:
-        equipos, partidos = load_data()
-        st.session_state.equipos = equipos or []
-        st.session_state.partidos = partidos or []
-        calcular_estadisticas()
+        _refresh_state()
     else:
         st.warning("No se pudo guardar el partido en la base de datos")
 
 
+@_exclusive
 def update_partido_db(partido_id, rounds_list):
     # Actualizar partido en data.json: sobrescribimos rounds_json y recalculamos estadísticas
-    data_file = DATA_DIR / "data.json"
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception:
         st.warning("No se pudo leer data.json")
         return False
@@ -482,112 +868,55 @@ def update_partido_db(partido_id, rounds_list):
         return False
 
     # reconstruir rounds y campos a partir de rounds_list
-    total_e1 = 0
-    total_e2 = 0
-    sets_e1 = 0
-    sets_e2 = 0
-    rounds_serializable = []
-    round_bonus_e1 = 0
-    round_bonus_e2 = 0
-    for rd in rounds_list:
-        pe1 = int(rd.get('puntos_e1', 0))
-        pe2 = int(rd.get('puntos_e2', 0))
-        total_e1 += pe1
-        total_e2 += pe2
-        if pe1 == 100 or pe2 == 100:
-            if pe1 == 100 and pe2 != 100:
-                sets_e1 += 1
-                winner = partido.get('equipo1_id')
-            elif pe2 == 100 and pe1 != 100:
-                sets_e2 += 1
-                winner = partido.get('equipo2_id')
-            else:
-                winner = None
-        else:
-            if pe1 > pe2:
-                sets_e1 += 1
-                winner = partido.get('equipo1_id')
-            elif pe2 > pe1:
-                sets_e2 += 1
-                winner = partido.get('equipo2_id')
-            else:
-                winner = None
-        # calcular bono por la ronda
-        if winner == partido.get('equipo1_id'):
-            diff = abs(pe1 - pe2)
-            round_bonus_e1 += 2 if diff >= 35 else 1
-        elif winner == partido.get('equipo2_id'):
-            diff = abs(pe1 - pe2)
-            round_bonus_e2 += 2 if diff >= 35 else 1
-
-        rounds_serializable.append({'puntos_e1': pe1, 'puntos_e2': pe2, 'winner_id': winner})
-
-    # Determinar ganador tras editar: preferir quien llegó a 2 sets.
-    if sets_e1 >= 2:
-        new_ganador = partido.get('equipo1_id')
-    elif sets_e2 >= 2:
-        new_ganador = partido.get('equipo2_id')
-    else:
-        # desempatar por totales
-        if total_e1 > total_e2:
-            new_ganador = partido.get('equipo1_id')
-        elif total_e2 > total_e1:
-            new_ganador = partido.get('equipo2_id')
-        else:
-            new_ganador = partido.get('equipo1_id')
+    (total_e1, total_e2, sets_e1, sets_e2,
+     round_bonus_e1, round_bonus_e2, rounds_serializable) = _score_rounds(
+        rounds_list, partido.get('equipo1_id'), partido.get('equipo2_id'))
+
+    # Determinar ganador tras editar: misma regla que al registrar el partido
+    new_ganador = _match_winner(sets_e1, sets_e2, total_e1, total_e2,
+                                partido.get('equipo1_id'), partido.get('equipo2_id'))
 
     # No otorgamos puntos de partido; los puntos son solo los bonos por rondas
     new_match_pts_e1, new_match_pts_e2 = 0, 0
 
-    partido['puntos_e1'] = total_e1
-    partido['puntos_e2'] = total_e2
-    partido['rounds_json'] = _json.dumps(rounds_serializable, ensure_ascii=False)
-    partido['ganador_id'] = new_ganador
-    partido['match_pts_e1'] = new_match_pts_e1
-    partido['match_pts_e2'] = new_match_pts_e2
-    partido['round_bonus_e1'] = round_bonus_e1
-    partido['round_bonus_e2'] = round_bonus_e2
-    partido['fecha'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    # recalcular estadísticas globales
+    # Las rondas viven dentro del propio partido, así que toda la edición es una sola
+    # escritura; si el detalle no cambió ni siquiera hace falta esa escritura.
     try:
-        for e in store.get('equipos', []):
-            e['puntos_total'] = 0
-            e['partidos_jugados'] = 0
-            e['partidos_ganados'] = 0
-            e['partidos_perdidos'] = 0
-        equipos_map = {e['id']: e for e in store.get('equipos', [])}
-        for p in store.get('partidos', []):
-            e1 = equipos_map.get(p.get('equipo1_id'))
-            e2 = equipos_map.get(p.get('equipo2_id'))
-            if not e1 or not e2:
-                continue
-            e1['partidos_jugados'] = e1.get('partidos_jugados', 0) + 1
-            e2['partidos_jugados'] = e2.get('partidos_jugados', 0) + 1
-            # sumar SOLO los bonos por rondas al ganador del partido
-            if p.get('ganador_id') == e1.get('id'):
-                e1['puntos_total'] = e1.get('puntos_total', 0) + (p.get('round_bonus_e1') or 0)
-            if p.get('ganador_id') == e2.get('id'):
-                e2['puntos_total'] = e2.get('puntos_total', 0) + (p.get('round_bonus_e2') or 0)
-            if p.get('ganador_id') is not None:
-                equipos_map[p.get('ganador_id')]['partidos_ganados'] = equipos_map[p.get('ganador_id')].get('partidos_ganados', 0) + 1
-                loser = p.get('equipo2_id') if p.get('ganador_id') == p.get('equipo1_id') else p.get('equipo1_id')
-                equipos_map[loser]['partidos_perdidos'] = equipos_map[loser].get('partidos_perdidos', 0) + 1
-
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
+        rondas_previas = _loads_json(partido.get('rounds_json') or '[]')
+    except Exception:
+        rondas_previas = None
+    if rondas_previas == rounds_serializable and partido.get('ganador_id') == new_ganador:
+        return True
+
+    try:
+        with _store_txn(store) as nuevo:
+            # restar la contribución anterior del partido y sumar la nueva tras editarlo
+            equipos_map = _id_index(nuevo)
+            partido = next(p for p in nuevo['partidos'] if p.get('id') == partido_id)
+            _apply_partido_stats(equipos_map, partido, -1)
+
+            partido['puntos_e1'] = total_e1
+            partido['puntos_e2'] = total_e2
+            partido['rounds_json'] = _dumps_rounds(rounds_serializable)
+            partido['ganador_id'] = new_ganador
+            partido['match_pts_e1'] = new_match_pts_e1
+            partido['match_pts_e2'] = new_match_pts_e2
+            partido['round_bonus_e1'] = round_bonus_e1
+            partido['round_bonus_e2'] = round_bonus_e2
+            partido['fecha'] = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+            _apply_partido_stats(equipos_map, partido)
         return True
     except Exception as e:
         st.warning(f"Error actualizando partido en JSON: {e}")
         return False
 
 
+@_exclusive
 def delete_partido_db(partido_id):
     """Elimina un partido y ajusta las estadísticas de los equipos afectados."""
-    data_file = DATA_DIR / "data.json"
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            store = _json.load(f)
+        store = _load_store()
     except Exception:
         st.warning("No se pudo leer data.json")
         return False
@@ -598,66 +927,163 @@ def delete_partido_db(partido_id):
         st.error("Partido no encontrado")
         return False
 
-    store['partidos'] = [p for p in partidos if p.get('id') != partido_id]
-
-    # recalcular estadísticas
     try:
-        for e in store.get('equipos', []):
-            e['puntos_total'] = 0
-            e['partidos_jugados'] = 0
-            e['partidos_ganados'] = 0
-            e['partidos_perdidos'] = 0
-        equipos_map = {e['id']: e for e in store.get('equipos', [])}
-        for p in store.get('partidos', []):
-            e1 = equipos_map.get(p.get('equipo1_id'))
-            e2 = equipos_map.get(p.get('equipo2_id'))
-            if not e1 or not e2:
-                continue
-            e1['partidos_jugados'] = e1.get('partidos_jugados', 0) + 1
-            e2['partidos_jugados'] = e2.get('partidos_jugados', 0) + 1
-            # sumar SOLO los bonos por rondas al ganador del partido
-            if p.get('ganador_id') == e1.get('id'):
-                e1['puntos_total'] = e1.get('puntos_total', 0) + (p.get('round_bonus_e1') or 0)
-            if p.get('ganador_id') == e2.get('id'):
-                e2['puntos_total'] = e2.get('puntos_total', 0) + (p.get('round_bonus_e2') or 0)
-            if p.get('ganador_id') is not None:
-                equipos_map[p.get('ganador_id')]['partidos_ganados'] = equipos_map[p.get('ganador_id')].get('partidos_ganados', 0) + 1
-                loser = p.get('equipo2_id') if p.get('ganador_id') == p.get('equipo1_id') else p.get('equipo1_id')
-                equipos_map[loser]['partidos_perdidos'] = equipos_map[loser].get('partidos_perdidos', 0) + 1
-
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(store, f, ensure_ascii=False, indent=2)
+        with _store_txn(store) as nuevo:
+            nuevo['partidos'] = [p for p in nuevo['partidos'] if p.get('id') != partido_id]
+            _apply_partido_stats(_id_index(nuevo), partida, -1)
         return True
     except Exception as e:
         st.warning(f"Error eliminando partido en JSON: {e}")
         return False
 
 
+@_exclusive
 def clear_database():
     """Elimina todos los partidos y equipos (limpieza total)."""
-    data_file = DATA_DIR / "data.json"
     try:
-        base = {"equipos": [], "partidos": []}
-        with open(data_file, "w", encoding="utf-8") as f:
-            _json.dump(base, f, ensure_ascii=False, indent=2)
+        with _store_txn(_empty_store()):
+            pass
         return True
     except Exception as e:
         st.warning(f"Error limpiando data.json: {e}")
         return False
 
+# Inicializar session state (cargar persistencia si existe)
+_ensure_schema()
+st.session_state.setdefault('data_version', 0)
+if 'partidos' not in st.session_state or 'equipos' not in st.session_state:
+    equipos, partidos = load_data()
+    st.session_state.partidos = partidos or []
+    st.session_state.equipos = equipos or []
+if 'ronda_actual' not in st.session_state:
+    st.session_state.ronda_actual = 1
+# Estado de sesión para autenticación de organizador
+if 'is_admin' not in st.session_state:
+    st.session_state.is_admin = False
+
 # Header principal
 st.markdown('<div class="main-header">🏆 TORNEO DE DOMINÓ 2025C</div>', unsafe_allow_html=True)
 
+# Mensaje de la última acción: se guarda antes de st.rerun() y se muestra una sola
+# vez como toast (no bloquea ni ocupa sitio en la página)
+_last_msg = st.session_state.pop('last_msg', None)
+if _last_msg:
+    st.toast(_last_msg)
+
+
+@functools.lru_cache(maxsize=64)
+def _heading_html(text, level):
+    tag = f"h{level}"
+    return f"<{tag} style=\"text-align:center\">{text}</{tag}>"
+
+
+@functools.lru_cache(maxsize=64)
+def _subheader_html(text):
+    return f'<div class="sub-header" style="text-align:center">{text}</div>'
+
 
 def centered_heading(text, level=3):
     """Muestra un encabezado centrado en la página."""
-    tag = f"h{level}"
-    st.markdown(f"<{tag} style=\"text-align:center\">{text}</{tag}>", unsafe_allow_html=True)
+    # solo se cachea el HTML: st.markdown debe llamarse en cada rerun para que se pinte
+    st.markdown(_heading_html(text, level), unsafe_allow_html=True)
 
 
 def centered_subheader(text):
     """Muestra un sub-encabezado (clase sub-header) centrado."""
-    st.markdown(f'<div class="sub-header" style="text-align:center">{text}</div>', unsafe_allow_html=True)
+    st.markdown(_subheader_html(text), unsafe_allow_html=True)
+
+# st.fragment (Streamlit >= 1.37) limita los reruns a su bloque; en versiones
+# anteriores el bloque se ejecuta como una función normal
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+
+@_fragment
+def _results_entry():
+    """Bloque "Ingresar Resultados" del panel de organizador.
+
+    Como fragmento, cambiar los equipos o enviar el formulario solo vuelve a
+    ejecutar este bloque (no `load_data`, las tarjetas ni la tabla de gestión);
+    tras guardar, `st.rerun()` sí refresca la página entera.
+    """
+    if len(st.session_state.equipos) >= 2:
+        # evitar seleccionar rivales ya jugados
+        team_names = _team_names(st.session_state.get('_data_key'), st.session_state.equipos)
+        equipo1 = st.selectbox("Equipo 1", team_names, key="ing_e1")
+        # rivales ya enfrentados (desde data.json, cacheado por su mtime)
+        jugados_por_e1 = opponents_played(equipo1)
+        otros_equipos = [n for n in team_names if n != equipo1 and n not in jugados_por_e1]
+        if not otros_equipos:
+            st.info("No hay oponentes disponibles que no hayan jugado ya contra este equipo.")
+        else:
+            # preparar índices y selectbox PARA equipo2 fuera del form para evitar problemas
+            try:
+                e1_idx = team_names.index(equipo1)
+            except ValueError:
+                e1_idx = 0
+            equipo2 = st.selectbox("Equipo 2", otros_equipos, key=f"ing_e2_{e1_idx}")
+
+            # sin clear_on_submit: si el envío se rechaza (p. ej. falta la Ronda 3)
+            # los puntos ya tecleados se conservan; se limpian solo al guardar
+            with st.form("form_resultado", clear_on_submit=False):
+                st.markdown("**Ingresa los puntos por ronda (una ronda finaliza cuando un equipo tiene exactamente 100 pts).**")
+                st.caption("La Ronda 3 solo se guarda si tras las dos primeras hay empate 1-1 (o no hay ganador claro y se rellena).")
+
+                # Todas las rondas dentro del form: los valores solo llegan al
+                # script al enviar, así que la decisión 2/3 rondas se toma tras
+                # el envío y no en cada pulsación. Claves fijas: el par de
+                # equipos ya lo fijan los selectbox de arriba.
+                c1, c2 = st.columns(2)
+                with c1:
+                    r1_p1 = st.number_input(f"Ronda 1 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key="ing_r1_e1")
+                with c2:
+                    r1_p2 = st.number_input(f"Ronda 1 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key="ing_r1_e2")
+
+                c3, c4 = st.columns(2)
+                with c3:
+                    r2_p1 = st.number_input(f"Ronda 2 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key="ing_r2_e1")
+                with c4:
+                    r2_p2 = st.number_input(f"Ronda 2 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key="ing_r2_e2")
+
+                c5, c6 = st.columns(2)
+                with c5:
+                    r3_p1 = st.number_input(f"Ronda 3 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key="ing_r3_e1")
+                with c6:
+                    r3_p2 = st.number_input(f"Ronda 3 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key="ing_r3_e2")
+
+                if st.form_submit_button("🎯 Guardar Resultado del Partido", use_container_width=True):
+                    # calcular sets ganados tras 2 rondas con la regla ==100 para determinar si
+                    # la tercera ronda fue necesaria
+                    sets_e1, sets_e2 = sets_won([r1_p1, r2_p1], [r1_p2, r2_p2])
+
+                    # decidir número de rondas jugadas:
+                    # - si ya hay ganador tras 2 rondas, se ignora la R3
+                    # - si quedó 1-1 (cada uno ganó una), la R3 es obligatoria
+                    # - en cualquier otro caso, se guarda la R3 solo si se rellenó
+                    ganador_tras_2 = (sets_e1 >= 2 or sets_e2 >= 2)
+                    empate_tras_2 = (sets_e1 == 1 and sets_e2 == 1)
+                    r3_rellena = bool(r3_p1 or r3_p2)
+
+                    rounds_list = [{'puntos_e1': int(r1_p1), 'puntos_e2': int(r1_p2)}, {'puntos_e1': int(r2_p1), 'puntos_e2': int(r2_p2)}]
+                    if not ganador_tras_2 and r3_rellena:
+                        rounds_list.append({'puntos_e1': int(r3_p1), 'puntos_e2': int(r3_p2)})
+
+                    if not equipo1 or not equipo2 or equipo1 == equipo2:
+                        st.error("❌ Selecciona equipos diferentes")
+                    elif empate_tras_2 and not r3_rellena:
+                        st.error("❌ Empate 1-1 tras 2 rondas — ingresa la Ronda 3 para desempatar.")
+                    else:
+                        new_id = add_partido_db(st.session_state.ronda_actual, equipo1, equipo2, rounds_list, datetime.now().strftime("%Y-%m-%d %H:%M"))
+                        if new_id:
+                            _refresh_state()
+                            for k in ("ing_r1_e1", "ing_r1_e2", "ing_r2_e1", "ing_r2_e2", "ing_r3_e1", "ing_r3_e2"):
+                                st.session_state.pop(k, None)
+                            st.session_state['last_msg'] = f"✅ Partido registrado: {equipo1} vs {equipo2}"
+                            st.rerun()
+                        else:
+                            st.error("❌ No se pudo guardar el partido (posible duplicado o error)")
+    else:
+        st.info("➕ Agrega al menos 2 equipos para poder ingresar resultados")
+
 
 # Sidebar para modo de vista
 st.sidebar.markdown("## 🎮 Configuración del Torneo")
@@ -702,14 +1128,14 @@ if modo == "⚙️ Panel Organizador":
         centered_subheader('⚙️ Panel de Control del Organizador')
         
         # Estadísticas rápidas
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.markdown(f'<div class="stat-card"><h3>👥 Equipos</h3><h2>{len(st.session_state.equipos)}</h2></div>', unsafe_allow_html=True)
-        with col2:
-            st.markdown(f'<div class="stat-card"><h3>🎯 Partidos</h3><h2>{len(st.session_state.partidos)}</h2></div>', unsafe_allow_html=True)
-        with col3:
-            total_puntos = sum(equipo.get('puntos_total', 0) for equipo in st.session_state.equipos)
-            st.markdown(f'<div class="stat-card"><h3>⭐ Puntos Totales</h3><h2>{total_puntos}</h2></div>', unsafe_allow_html=True)
+        # las tres tarjetas en un único bloque HTML (una sola actualización por rerun)
+        total_puntos = sum(equipo.get('puntos_total', 0) for equipo in st.session_state.equipos)
+        st.markdown(
+            '<div class="stat-grid">'
+            f'<div class="stat-card"><h3>👥 Equipos</h3><h2>{len(st.session_state.equipos)}</h2></div>'
+            f'<div class="stat-card"><h3>🎯 Partidos</h3><h2>{len(st.session_state.partidos)}</h2></div>'
+            f'<div class="stat-card"><h3>⭐ Puntos Totales</h3><h2>{total_puntos}</h2></div>'
+            '</div>', unsafe_allow_html=True)
         
         # Sección para ingresar resultados
         centered_subheader('📝 Ingresar Resultados')
@@ -718,120 +1144,7 @@ if modo == "⚙️ Panel Organizador":
         centered_subheader('🔐 Configuración de Contraseña')
         st.info('La contraseña de organizador es fija para uso local. Cambia `ADMIN_PASS` en el código si lo deseas.')
 
-        if len(st.session_state.equipos) >= 2:
-            # evitar seleccionar rivales ya jugados
-            equipo1 = st.selectbox("Equipo 1", [j['nombre'] for j in st.session_state.equipos], key="ing_e1")
-            # construir lista de rivales no jugados
-            jugados_por_e1 = set()
-            for p in st.session_state.partidos:
-                if p.get('equipo1') == equipo1:
-                    jugados_por_e1.add(p.get('equipo2'))
-                elif p.get('equipo2') == equipo1:
-                    jugados_por_e1.add(p.get('equipo1'))
-            otros_equipos = [j['nombre'] for j in st.session_state.equipos if j['nombre'] != equipo1 and j['nombre'] not in jugados_por_e1]
-            if not otros_equipos:
-                st.info("No hay oponentes disponibles que no hayan jugado ya contra este equipo.")
-            else:
-                # preparar índices y selectbox PARA equipo2 fuera del form para evitar problemas
-                team_names = [j['nombre'] for j in st.session_state.equipos]
-                try:
-                    e1_idx = team_names.index(equipo1)
-                except ValueError:
-                    e1_idx = 0
-                equipo2 = st.selectbox("Equipo 2", otros_equipos, key=f"ing_e2_{e1_idx}")
-                try:
-                    e2_idx = team_names.index(equipo2)
-                except Exception:
-                    e2_idx = 0
-
-                with st.form("form_resultado", clear_on_submit=True):
-                    st.markdown("**Ingresa los puntos por ronda (una ronda finaliza cuando un equipo tiene exactamente 100 pts).**")
-
-                    # Selección explícita de cuántas rondas se jugaron (2 o 3).
-                    # Si tras las dos primeras rondas ya hay un ganador, forzamos 2.
-                    # Por defecto proponemos 3 rondas.
-                    # Calcular provisionalmente sets tras 2 rondas para forzar opción
-                    c1, c2 = st.columns(2)
-                    with c1:
-                        r1_p1 = st.number_input(f"Ronda 1 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key=f"ing_r1_e1_{e1_idx}_{e2_idx}")
-                    with c2:
-                        r1_p2 = st.number_input(f"Ronda 1 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key=f"ing_r1_e2_{e1_idx}_{e2_idx}")
-
-                    c3, c4 = st.columns(2)
-                    with c3:
-                        r2_p1 = st.number_input(f"Ronda 2 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key=f"ing_r2_e1_{e1_idx}_{e2_idx}")
-                    with c4:
-                        r2_p2 = st.number_input(f"Ronda 2 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key=f"ing_r2_e2_{e1_idx}_{e2_idx}")
-
-                    # calcular sets ganados tras 2 rondas con la regla ==100 para determinar si
-                    # la tercera ronda fue necesaria
-                    sets_e1 = 0
-                    sets_e2 = 0
-                    # Ronda 1
-                    if r1_p1 == 100 and r1_p2 != 100:
-                        sets_e1 += 1
-                    elif r1_p2 == 100 and r1_p1 != 100:
-                        sets_e2 += 1
-                    else:
-                        if r1_p1 > r1_p2:
-                            sets_e1 += 1
-                        elif r1_p2 > r1_p1:
-                            sets_e2 += 1
-                    # Ronda 2
-                    if r2_p1 == 100 and r2_p2 != 100:
-                        sets_e1 += 1
-                    elif r2_p2 == 100 and r2_p1 != 100:
-                        sets_e2 += 1
-                    else:
-                        if r2_p1 > r2_p2:
-                            sets_e1 += 1
-                        elif r2_p2 > r2_p1:
-                            sets_e2 += 1
-
-                    # decidir número de rondas jugadas:
-                    # - si ya hay ganador tras 2 rondas, forzamos 2 (no se juega R3)
-                    # - si quedó 1-1 (cada uno ganó una), forzamos 3 (R3 obligatoria)
-                    # - en cualquier otro caso, permitimos elegir 2/3 (por defecto 3)
-                    ganador_tras_2 = (sets_e1 >= 2 or sets_e2 >= 2)
-                    empate_tras_2 = (sets_e1 == 1 and sets_e2 == 1)
-                    if ganador_tras_2:
-                        rondas_jugadas = 2
-                        st.info("Partida cerrada en 2 rondas; tercera ronda no necesaria.")
-                    elif empate_tras_2:
-                        rondas_jugadas = 3
-                        st.info("Empate 1-1 tras 2 rondas — Ronda 3 obligatoria para desempatar.")
-                    else:
-                        rondas_jugadas = st.selectbox("Rondas jugadas:", [2, 3], index=1)
-
-                    rounds_list = [{'puntos_e1': int(r1_p1), 'puntos_e2': int(r1_p2)}, {'puntos_e1': int(r2_p1), 'puntos_e2': int(r2_p2)}]
-
-                    # Mostrar Ronda 3 solo si el usuario indicó 3 rondas y no hubo ganador ya
-                    if rondas_jugadas == 3 and not ganador_tras_2:
-                        c5, c6 = st.columns(2)
-                        with c5:
-                            r3_p1 = st.number_input(f"Ronda 3 - Puntos {equipo1}", min_value=0, max_value=500, value=0, key=f"ing_r3_e1_{e1_idx}_{e2_idx}")
-                        with c6:
-                            r3_p2 = st.number_input(f"Ronda 3 - Puntos {equipo2}", min_value=0, max_value=500, value=0, key=f"ing_r3_e2_{e1_idx}_{e2_idx}")
-                        rounds_list.append({'puntos_e1': int(r3_p1), 'puntos_e2': int(r3_p2)})
-
-                    submitted = st.form_submit_button("🎯 Guardar Resultado del Partido", use_container_width=True)
-                    if submitted:
-                        if not equipo1 or not equipo2 or equipo1 == equipo2:
-                            st.error("❌ Selecciona equipos diferentes")
-                        else:
-                            new_id = add_partido_db(st.session_state.ronda_actual, equipo1, equipo2, rounds_list, datetime.now().strftime("%Y-%m-%d %H:%M"))
-                            if new_id:
-                                equipos, partidos = load_data()
-                                st.session_state.equipos = equipos or []
-                                st.session_state.partidos = partidos or []
-                                calcular_estadisticas()
-                                st.success(f"✅ Partido registrado: {equipo1} vs {equipo2}")
-                                time.sleep(1)
-                                st.rerun()
-                            else:
-                                st.error("❌ No se pudo guardar el partido (posible duplicado o error)")
-        else:
-            st.info("➕ Agrega al menos 2 equipos para poder ingresar resultados")
+        _results_entry()
         
         # Gestión de equipos
         centered_subheader('👥 Gestión de Equipos')
@@ -839,11 +1152,11 @@ if modo == "⚙️ Panel Organizador":
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            # Mostrar equipos con sus columnas relevantes
-            df = pd.DataFrame(st.session_state.equipos)
-            if not df.empty:
-                df = df[['id', 'nombre', 'jugador1', 'jugador2', 'puntos_total', 'partidos_ganados', 'partidos_perdidos', 'partidos_jugados']]
-            st.dataframe(df, use_container_width=True)
+            # Mostrar equipos con sus columnas relevantes (sin DataFrame si no hay equipos)
+            if not st.session_state.equipos:
+                st.info("No hay equipos")
+            else:
+                st.dataframe(build_gestion_df(st.session_state.get('_data_key'), st.session_state.equipos), use_container_width=True)
         
         with col2:
             with st.form("nuevo_equipo", clear_on_submit=True):
@@ -858,10 +1171,8 @@ if modo == "⚙️ Panel Organizador":
                             nombre_equipo = f"{jugador_a} & {jugador_b}"
                         new_id = add_team_db(nombre_equipo, jugador_a, jugador_b)
                         if new_id:
-                            equipos, partidos = load_data()
-                            st.session_state.equipos = equipos or []
-                            st.session_state.partidos = partidos or []
-                            st.success(f"✅ Equipo '{nombre_equipo}' agregado")
+                            _refresh_state()
+                            st.session_state['last_msg'] = f"✅ Equipo '{nombre_equipo}' agregado"
                             st.rerun()
                         else:
                             st.error(f"❌ No se pudo agregar. El nombre de equipo '{nombre_equipo}' ya existe o hubo un error.")
@@ -870,7 +1181,7 @@ if modo == "⚙️ Panel Organizador":
             st.markdown("**Renombrar Equipo**")
             with st.form("renombrar_equipo", clear_on_submit=True):
                 if st.session_state.equipos:
-                    opciones_equipos = {e['nombre']: e['id'] for e in st.session_state.equipos}
+                    opciones_equipos = {nombre: eid for eid, nombre in get_equipos_by_id().items()}
                     sel_nombre = st.selectbox("Selecciona equipo:", list(opciones_equipos.keys()), key="sel_rename_team")
                     nuevo_nombre = st.text_input("Nuevo nombre del equipo", key="new_team_name")
                     if st.form_submit_button("🔁 Renombrar equipo"):
@@ -880,11 +1191,8 @@ if modo == "⚙️ Panel Organizador":
                             equipo_id = opciones_equipos.get(sel_nombre)
                             ok = rename_team_db(equipo_id, nuevo_nombre)
                             if ok:
-                                equipos, partidos = load_data()
-                                st.session_state.equipos = equipos or []
-                                st.session_state.partidos = partidos or []
-                                calcular_estadisticas()
-                                st.success(f"✅ Equipo '{sel_nombre}' renombrado a '{nuevo_nombre}'")
+                                _refresh_state()
+                                st.session_state['last_msg'] = f"✅ Equipo '{sel_nombre}' renombrado a '{nuevo_nombre}'"
                                 st.rerun()
                             else:
                                 st.error("❌ No se pudo renombrar el equipo")
@@ -896,21 +1204,22 @@ if modo == "⚙️ Panel Organizador":
         centered_subheader('✏️ Editor de Partidos')
         partidos_list = st.session_state.partidos
         if partidos_list:
-            opciones = [f"{p['id']}: {p.get('equipo1')} vs {p.get('equipo2')}" for p in partidos_list]
-            sel = st.selectbox("Selecciona partido a editar", opciones)
-            if sel:
-                partido_id = int(sel.split(":")[0])
-                partido_row = next((p for p in partidos_list if p['id'] == partido_id), None)
+            # opciones = ids; la etiqueta se resuelve con format_func y la fila por id
+            partidos_by_id = {p['id']: p for p in partidos_list}
+            etiquetas = {pid: f"{pid}: {p.get('equipo1')} vs {p.get('equipo2')}" for pid, p in partidos_by_id.items()}
+            partido_id = st.selectbox("Selecciona partido a editar", list(etiquetas), format_func=etiquetas.get)
+            if partido_id is not None:
+                partido_row = partidos_by_id.get(partido_id)
                 if partido_row:
-                    import json as _json
-                    rounds_existing = []
-                    try:
-                        rounds_existing = _json.loads(partido_row.get('rounds_json') or '[]')
-                    except Exception:
-                        rounds_existing = []
-
-                    default_index = max(0, min(len(rounds_existing)-1, 2)) if rounds_existing else 0
-                    current_rondas = st.selectbox("Rondas", [1,2,3], index=default_index, key=f"edit_rondas_{partido_id}")
+                    rounds_existing = partido_row.get('rounds', [])
+
+                    # el valor elegido lo conserva el propio widget (key); el índice por
+                    # defecto solo hace falta la primera vez que se muestra este partido
+                    key_rondas = f"edit_rondas_{partido_id}"
+                    default_index = 0
+                    if key_rondas not in st.session_state and rounds_existing:
+                        default_index = max(0, min(len(rounds_existing)-1, 2))
+                    current_rondas = st.selectbox("Rondas", [1,2,3], index=default_index, key=key_rondas)
                     with st.form(f"edit_partido_{partido_id}"):
                         edit_rounds = []
                         for i in range(1, current_rondas+1):
@@ -926,10 +1235,8 @@ if modo == "⚙️ Panel Organizador":
                         if st.form_submit_button("💾 Guardar cambios"):
                             ok = update_partido_db(partido_id, edit_rounds)
                             if ok:
-                                equipos, partidos = load_data()
-                                st.session_state.equipos = equipos or []
-                                st.session_state.partidos = partidos or []
-                                st.success("✅ Partido actualizado")
+                                _refresh_state()
+                                st.session_state['last_msg'] = "✅ Partido actualizado"
                                 st.rerun()
                             else:
                                 st.error("❌ No se pudo actualizar el partido")
@@ -940,15 +1247,25 @@ if modo == "⚙️ Panel Organizador":
                         if st.button("🗑️ Eliminar partido", key=f"del_btn_{partido_id}"):
                             ok = delete_partido_db(partido_id)
                             if ok:
-                                equipos, partidos = load_data()
-                                st.session_state.equipos = equipos or []
-                                st.session_state.partidos = partidos or []
-                                st.success("✅ Partido eliminado")
+                                _refresh_state()
+                                st.session_state['last_msg'] = "✅ Partido eliminado"
                                 st.rerun()
                             else:
                                 st.error("❌ No se pudo eliminar el partido")
         else:
             st.info("No hay partidos para editar aún")
+
+        # Exportación legible de data.json
+        centered_subheader('💾 Exportar Datos')
+        # se pasan los bytes (no una función): `data` como callable solo existe
+        # en versiones recientes de Streamlit
+        try:
+            export_json = pretty_dump()
+        except Exception as e:
+            st.warning(f"No se pudo leer data.json: {e}")
+        else:
+            st.download_button("⬇️ Descargar data.json (indentado)", data=export_json,
+                               file_name="data.json", mime="application/json")
     
     else:
         if contraseña:
@@ -965,18 +1282,9 @@ else:
     if spec_view == "Tabla de partidos":
         # Mostrar tabla de posiciones para espectadores (solicitado)
         centered_heading("🏅 Tabla de Posiciones", level=3)
-        df_equipos = pd.DataFrame(st.session_state.equipos)
-        if not df_equipos.empty:
-            # Asegurar columnas necesarias
-            for col in ['partidos_jugados','partidos_ganados','partidos_perdidos','puntos_total']:
-                if col not in df_equipos.columns:
-                    df_equipos[col] = 0
-            df_equipos = df_equipos.sort_values(['puntos_total','partidos_ganados'], ascending=[False, False])
-            df_equipos['posicion'] = range(1, len(df_equipos) + 1)
-            # Añadir columna con los nombres de los jugadores del equipo
-            df_equipos['jugadores'] = df_equipos.apply(lambda r: f"{r.get('jugador1','')} & {r.get('jugador2','')}", axis=1)
-            df_show = df_equipos[['posicion','nombre','jugadores','partidos_jugados','partidos_ganados','partidos_perdidos','puntos_total']]
-            st.dataframe(df_show.reset_index(drop=True), use_container_width=True, hide_index=True)
+        if st.session_state.equipos:
+            df_show = build_standings_df(st.session_state.get('_data_key'), st.session_state.equipos)
+            st.dataframe(df_show, use_container_width=True, hide_index=True)
         else:
             st.info("📊 No hay equipos todavía")
 
@@ -984,41 +1292,19 @@ else:
         # Resultados completos: lista de partidos con desglose de rondas y detalles
         centered_heading("📋 Resultados Completos de Partidos", level=3)
         if st.session_state.partidos:
-            import json as _json
             # selector para filtrar por equipo o ver todos
-            equipos_nombres = [e['nombre'] for e in st.session_state.equipos]
-            filtro = st.selectbox("Filtrar por equipo:", ["Todos"] + equipos_nombres, index=0, key="filter_resultados")
-            partidos_filtrados = sorted(st.session_state.partidos, key=lambda x: x['id'], reverse=True)
+            equipos_nombres = _team_names(st.session_state.get('_data_key'), st.session_state.equipos)
+            filtro = st.selectbox("Filtrar por equipo:", ("Todos",) + equipos_nombres, index=0, key="filter_resultados")
+            df_res = build_resultados_df(st.session_state.get('_data_key'), st.session_state.partidos)
             if filtro != "Todos":
-                partidos_filtrados = [p for p in partidos_filtrados if filtro in (p.get('equipo1'), p.get('equipo2'))]
+                df_res = df_res[(df_res['Equipo1'] == filtro) | (df_res['Equipo2'] == filtro)]
+                # un único encabezado por vista filtrada, no uno por partido
+                centered_heading(f"Resultados de {filtro}", level=3)
 
-            if not partidos_filtrados:
+            if df_res.empty:
                 st.info("No hay partidos para mostrar con ese filtro")
             else:
-                for partido in partidos_filtrados:
-                    header = f"**{partido.get('equipo1')}** vs **{partido.get('equipo2')}** — Ronda {partido.get('ronda')} — Ganador: {partido.get('ganador')}"
-                    if filtro != "Todos":
-                        centered_heading(f"Resultados de {filtro}", level=3)
-                        st.markdown(header)
-                    else:
-                        st.markdown(header)
-                    try:
-                        rounds = _json.loads(partido.get('rounds_json') or '[]')
-                    except Exception:
-                        rounds = []
-                    if rounds:
-                        rows = []
-                        for idx, r in enumerate(rounds, start=1):
-                            winner_tag = ''
-                            if r.get('winner_id'):
-                                wid = r.get('winner_id')
-                                wname = next((e['nombre'] for e in st.session_state.equipos if e['id'] == wid), None)
-                                winner_tag = f" — Ganador ronda: {wname}" if wname else ''
-                            rows.append({'Ronda': idx, f"{partido.get('equipo1')}": r.get('puntos_e1'), f"{partido.get('equipo2')}": r.get('puntos_e2'), 'info': winner_tag})
-                        st.table(pd.DataFrame(rows))
-                    else:
-                        st.info("No hay detalle de rondas para este partido")
-                    st.markdown("---")
+                st.dataframe(df_res, use_container_width=True, hide_index=True)
         else:
             st.info("Aún no hay partidos registrados")
 